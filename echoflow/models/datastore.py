@@ -17,11 +17,28 @@ Email: sbutala@uw.edu
 Date: August 22, 2023
 """
 from enum import Enum
+from functools import lru_cache
 from typing import Any, Dict, Optional
 
 import jinja2
 from pydantic import BaseModel
 
+_JINJA_ENV = jinja2.Environment()
+
+
+@lru_cache(maxsize=128)
+def _compile_template(urlpath: str) -> jinja2.Template:
+    """
+    Compiles and caches the jinja2 template of a URL path.
+
+    Args:
+        urlpath (str): The URL path template.
+
+    Returns:
+        jinja2.Template: Compiled template.
+    """
+    return _JINJA_ENV.from_string(urlpath)
+
 
 class StorageType(Enum):
     """
@@ -114,8 +131,7 @@ class Args(BaseModel):
             str: Rendered URL path.
         """
         if self.parameters is not None:
-            env = jinja2.Environment()
-            template = env.from_string(self.urlpath)
+            template = _compile_template(self.urlpath)
             return template.render(self.parameters)
         return self.urlpath
 
@@ -53,12 +53,14 @@ class Recipe(BaseModel):
         active_recipe (str): The active recipe name.
         use_local_dask (bool): Flag to indicate whether to use local Dask. Default is False.
         n_workers (int): Number of workers to spin up for local cluster. Default is 3 
+        local_dask_processes (bool): Run the local cluster workers as processes. Set to False to use threaded workers sharing memory, suited to I/O bound pipelines. Default is True.
         scheduler_address (str): The scheduler address. Default is None.
         pipeline (List[Pipeline]): List of pipelines in the recipe.
     """
     active_recipe: str
     use_local_dask: bool = False
     n_workers: int = 3
+    local_dask_processes: bool = True
     scheduler_address: str = None
     pipeline: List[Pipeline]
 
@@ -26,17 +26,21 @@ Date: August 22, 2023
 
 import asyncio
 import configparser
+import copy
 import json
 import os
+import shutil
 import socket
+import tempfile
+import time
+from contextlib import contextmanager
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Coroutine, Dict, List, Optional, Union
 
 import toml
 from prefect.blocks.core import Block
-from prefect_aws import AwsCredentials
-from prefect_azure import AzureCosmosDbCredentials
 from pydantic import SecretStr
 
 from echoflow.models.datastore import StorageType
@@ -47,11 +51,25 @@ from echoflow.utils.config_utils import get_storage_options, load_block
 from echoflow.stages.echoflow_trigger import echoflow_trigger
 from echoflow.utils.file_utils import format_windows_path
 
+PREFECT_PROFILES_PATH = os.path.expanduser(os.path.join("~", ".prefect", "profiles.toml"))
+# Number of seconds the internet connection check result is reused for
+INTERNET_CHECK_TTL = 60
+
+# Echoflow configuration block shared by a batch of updates, see `_echoflow_config_batch`
+_echoflow_config_cache: Optional[EchoflowConfig] = None
+_echoflow_config_batch_active: bool = False
+# Parsed Prefect profiles file and the modification time it was parsed at
+_profiles_cache: Optional[Dict[str, Any]] = None
+_profiles_mtime: Optional[int] = None
+
 
 def check_internet_connection(host="8.8.8.8", port=53, timeout=5):
     """
     Check if there is an active internet connection.
 
+    The result is reused for up to `INTERNET_CHECK_TTL` seconds. Setting the environment
+    variable `ECHOFLOW_ASSUME_ONLINE=1` skips the check entirely.
+
     Args:
         host (str, optional): IP address or hostname to check the connection to. Defaults to "8.8.8.8".
         port (int, optional): Port number to check the connection on. Defaults to 53 (DNS port).
@@ -65,13 +83,29 @@ def check_internet_connection(host="8.8.8.8", port=53, timeout=5):
         internet_available = check_internet_connection()
         print("Internet connection available:", internet_available)
     """
-    try:
-        # Set a timeout for the connection check
-        socket.setdefaulttimeout(timeout)
-        # Create a socket and connect to the host and port
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
+    if os.environ.get("ECHOFLOW_ASSUME_ONLINE") == "1":
         return True
-    except Exception as e:
+    return _check_internet_connection(host, port, timeout, time.monotonic() // INTERNET_CHECK_TTL)
+
+
+@lru_cache(maxsize=8)
+def _check_internet_connection(host: str, port: int, timeout: float, ttl_bucket: float) -> bool:
+    """
+    Open a TCP connection to check connectivity, memoized per `ttl_bucket`.
+
+    Args:
+        host (str): IP address or hostname to check the connection to.
+        port (int): Port number to check the connection on.
+        timeout (float): Timeout for the connection check in seconds.
+        ttl_bucket (float): Time window the result is cached for.
+
+    Returns:
+        bool: True if the connection is successful, False otherwise.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
         return False
 
 
@@ -102,9 +136,7 @@ def echoflow_create_prefect_profile(
             set_active=True,
         )
     """
-    config_path = os.path.expanduser(os.path.join("~", ".prefect", "profiles.toml"))
-    with open(config_path, "r") as f:
-        config = toml.load(f)
+    config = _load_profiles()
 
     # Update the active profile if specified
     if set_active:
@@ -120,8 +152,7 @@ def echoflow_create_prefect_profile(
         profiles[name] = {}
 
     # Save the updated configuration file
-    with open(config_path, "w") as f:
-        toml.dump(config, f)
+    _save_profiles(config)
 
     # Does not update if switching from cloud to local or vice-versa, but updates the old profile which is active. This is the default behaviour of Prefect.
     update_prefect_config(
@@ -145,9 +176,7 @@ def load_profile(name: str):
     """
 
     # Load the existing Prefect configuration file
-    config_path = os.path.expanduser(os.path.join("~", ".prefect", "profiles.toml"))
-    with open(config_path, "r") as f:
-        config = toml.load(f)
+    config = _load_profiles()
 
     # Check if the specified profile exists
     if config.get("profiles").get(name) is None:
@@ -158,8 +187,7 @@ def load_profile(name: str):
     config["active"] = name
 
     # Save the updated configuration file
-    with open(config_path, "w") as f:
-        toml.dump(config, f)
+    _save_profiles(config)
 
 
 def get_active_profile():
@@ -175,9 +203,7 @@ def get_active_profile():
         print("Active profile configuration:", active_profile)
     """
     # Load the existing Prefect configuration file
-    config_path = os.path.expanduser(os.path.join("~", ".prefect", "profiles.toml"))
-    with open(config_path, "r") as f:
-        config = toml.load(f)
+    config = _load_profiles()
 
     profiles = config["profiles"]
 
@@ -189,6 +215,46 @@ def get_active_profile():
     raise ValueError("No profile found.")
 
 
+def _load_profiles() -> Dict[str, Any]:
+    """
+    Load the Prefect profiles file, parsing it again only when it changed on disk.
+
+    Returns:
+        Dict[str, Any]: A copy of the parsed profiles configuration, safe to modify.
+    """
+    global _profiles_cache, _profiles_mtime
+    mtime = os.stat(PREFECT_PROFILES_PATH).st_mtime_ns
+    if _profiles_cache is None or mtime != _profiles_mtime:
+        with open(PREFECT_PROFILES_PATH, "r") as f:
+            _profiles_cache = toml.load(f)
+        _profiles_mtime = mtime
+    return copy.deepcopy(_profiles_cache)
+
+
+def _save_profiles(config: Dict[str, Any]):
+    """
+    Atomically write the Prefect profiles file and refresh the cached copy.
+
+    Args:
+        config (Dict[str, Any]): The profiles configuration to save.
+    """
+    global _profiles_cache, _profiles_mtime
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(PREFECT_PROFILES_PATH), suffix=".toml")
+    try:
+        with os.fdopen(fd, "w") as f:
+            toml.dump(config, f)
+        if os.path.exists(PREFECT_PROFILES_PATH):
+            # mkstemp creates the file with mode 0600, keep the permissions of the existing file
+            shutil.copymode(PREFECT_PROFILES_PATH, tmp_path)
+        os.replace(tmp_path, PREFECT_PROFILES_PATH)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    _profiles_cache = copy.deepcopy(config)
+    _profiles_mtime = os.stat(PREFECT_PROFILES_PATH).st_mtime_ns
+
+
 def echoflow_start(
     dataset_config: Union[Dict[str, Any], str, Path],
     pipeline_config: Union[Dict[str, Any], str, Path],
@@ -296,6 +362,28 @@ def update_prefect_config(
             active=True
         )
     """
+    return asyncio.run(_update_prefect_config(
+        prefect_api_key=prefect_api_key,
+        prefect_account_id=prefect_account_id,
+        prefect_workspace_id=prefect_workspace_id,
+        profile_name=profile_name,
+        active=active,
+    ))
+
+
+async def _update_prefect_config(
+    prefect_api_key: Optional[str] = None,
+    prefect_account_id: Optional[str] = None,
+    prefect_workspace_id: Optional[str] = None,
+    profile_name: str = None,
+    active: bool = True,
+):
+    """
+    Asynchronous implementation of `update_prefect_config`.
+
+    The profile block is saved while the echoflow configuration block is loaded,
+    then the echoflow configuration is saved with the updated profile list.
+    """
     profiles: List[str] = []
     prefect_config = EchoflowPrefectConfig(
         prefect_account_id=prefect_account_id,
@@ -304,43 +392,41 @@ def update_prefect_config(
         profile_name=profile_name,
     )
 
-    uuid = prefect_config.save(name=profile_name, overwrite=True)
-    if isinstance(uuid, Coroutine):
-        uuid = asyncio.run(uuid)
-
     active_profile: str = None
     if active:
         active_profile = profile_name
     profiles.append(profile_name)
 
-    try:
-        current_config = EchoflowConfig.load("echoflow-config", validate=False)
-        if isinstance(current_config, Coroutine):
-            current_config = asyncio.run(current_config)
+    uuid, current_config = await asyncio.gather(
+        _maybe_await(prefect_config.save(name=profile_name, overwrite=True)),
+        _load_echoflow_config(),
+        return_exceptions=True,
+    )
+    if isinstance(uuid, Exception):
+        raise uuid
+    if isinstance(current_config, ValueError):
+        # No echoflow configuration saved yet
+        current_config = None
+    elif isinstance(current_config, Exception):
+        raise current_config
+
+    blocks: List[BaseConfig] = []
+    if current_config is not None:
         if current_config.prefect_configs is not None:
 
             if active_profile is None:
                 active_profile = current_config.active
 
-            profiles = current_config.prefect_configs
+            profiles = list(current_config.prefect_configs)
 
             for p in profiles:
                 if p == profile_name:
                     profiles.remove(p)
             profiles.append(profile_name)
+        blocks = current_config.blocks
 
-        ecfg = EchoflowConfig(active=active_profile, prefect_configs=profiles, blocks=current_config.blocks).save(
-            "echoflow-config", overwrite=True
-        )
-        if isinstance(ecfg, Coroutine):
-            ecfg = asyncio.run(ecfg)
-    except ValueError as e:
-        ecfg = EchoflowConfig(active=active_profile, prefect_configs=profiles, blocks=[]).save(
-            "echoflow-config", overwrite=True
-        )
-        if isinstance(ecfg, Coroutine):
-            ecfg = asyncio.run(ecfg)
-    return ecfg
+    return await _save_echoflow_config(
+        EchoflowConfig(active=active_profile, prefect_configs=profiles, blocks=blocks))
 
 
 def update_base_config(name: str, b_type: StorageType, active: bool = False, options: Dict[str, Any] = {}):
@@ -365,35 +451,125 @@ def update_base_config(name: str, b_type: StorageType, active: bool = False, opt
             options={"option_key": "option_value"}
         )
     """
+    return asyncio.run(_update_base_config(
+        name=name, b_type=b_type, active=active, options=options))
+
+
+async def _update_base_config(
+    name: str, b_type: StorageType, active: bool = False, options: Optional[Dict[str, Any]] = None
+):
+    """
+    Asynchronous implementation of `update_base_config`.
+    """
     aws_base = BaseConfig(name=name, type=b_type,
-                          active=active, options=options)
-    ecfg: Any = None
+                          active=active, options=options if options is not None else {})
     try:
-        blocks: List[BaseConfig] = []
-        current_config = EchoflowConfig.load("echoflow-config", validate=False)
-        if isinstance(current_config, Coroutine):
-            current_config = asyncio.run(current_config)
-
-        if current_config.blocks is not None:
-            blocks = current_config.blocks
-            for b in blocks:
-                if b.name == name:
-                    blocks.remove(b)
-        blocks.append(aws_base)
-        ecfg = EchoflowConfig(
-            prefect_configs=current_config.prefect_configs, blocks=blocks
-        ).save("echoflow-config", overwrite=True)
-        if isinstance(ecfg, Coroutine):
-            ecfg = asyncio.run(ecfg)
-    except ValueError as e:
-        ecfg = EchoflowConfig(active=None, prefect_configs=[], blocks=[aws_base]).save(
-            "echoflow-config", overwrite=True
-        )
-        if isinstance(ecfg, Coroutine):
-            ecfg = asyncio.run(ecfg)
+        current_config = await _load_echoflow_config()
+    except ValueError:
+        return await _save_echoflow_config(
+            EchoflowConfig(active=None, prefect_configs=[], blocks=[aws_base]))
+
+    blocks: List[BaseConfig] = []
+    if current_config.blocks is not None:
+        blocks = [b for b in current_config.blocks if b.name != name]
+    blocks.append(aws_base)
+    return await _save_echoflow_config(EchoflowConfig(
+        prefect_configs=current_config.prefect_configs, blocks=blocks
+    ))
+
+
+@contextmanager
+def _echoflow_config_batch():
+    """
+    Shares the echoflow configuration block between the updates made within the context.
+
+    The block is loaded once by the first update and kept in sync with the following saves.
+    Outside of a batch it is loaded again on every update, so changes made from the
+    Prefect UI or another process are never overwritten.
+    """
+    global _echoflow_config_cache, _echoflow_config_batch_active
+    _echoflow_config_batch_active = True
+    try:
+        yield
+    finally:
+        _echoflow_config_batch_active = False
+        _echoflow_config_cache = None
+
+
+async def _load_echoflow_config() -> EchoflowConfig:
+    """
+    Loads the echoflow configuration block, reusing the copy of the current batch if any.
+
+    Returns:
+        EchoflowConfig: The echoflow configuration.
+
+    Raises:
+        ValueError: If no echoflow configuration block exists.
+    """
+    global _echoflow_config_cache
+    if _echoflow_config_batch_active and _echoflow_config_cache is not None:
+        return _echoflow_config_cache
+    echoflow_config = await _maybe_await(
+        EchoflowConfig.load("echoflow-config", validate=False))
+    if _echoflow_config_batch_active:
+        _echoflow_config_cache = echoflow_config
+    return echoflow_config
+
+
+async def _save_echoflow_config(echoflow_config: EchoflowConfig):
+    """
+    Saves the echoflow configuration block and refreshes the copy of the current batch if any.
+
+    Args:
+        echoflow_config (EchoflowConfig): The echoflow configuration to save.
+
+    Returns:
+        Any: Result of the block save.
+    """
+    global _echoflow_config_cache
+    _echoflow_config_cache = None
+    ecfg = await _maybe_await(echoflow_config.save("echoflow-config", overwrite=True))
+    if _echoflow_config_batch_active:
+        _echoflow_config_cache = echoflow_config
     return ecfg
 
 
+async def _save_credentials(
+    credentials: Block, name: str, b_type: StorageType, active: bool = False, options: Optional[Dict[str, Any]] = None
+):
+    """
+    Saves a credentials block, then registers it in the echoflow configuration block.
+
+    Both saves run in a single event loop. The configuration is only updated once the
+    credentials block is saved, so a failed save leaves no dangling registration.
+
+    Args:
+        credentials (Block): The credentials block to save.
+        name (str): Name of the configuration.
+        b_type (StorageType): Type of the configuration.
+        active (bool, optional): Set the configuration as active. Defaults to False.
+        options (Optional[Dict[str, Any]], optional): Additional options. Defaults to None.
+    """
+    await _maybe_await(credentials.save(name, overwrite=True))
+    await _update_base_config(name=name, active=active,
+                              options=options, b_type=b_type)
+
+
+async def _maybe_await(result: Any):
+    """
+    Awaits the result of a Prefect sync compatible call when it returned a coroutine.
+
+    Args:
+        result (Any): Result or coroutine returned by the call.
+
+    Returns:
+        Any: The resolved result.
+    """
+    if isinstance(result, Coroutine):
+        return await result
+    return result
+
+
 def echoflow_config_AWS(
     aws_access_key_id: str,
     aws_secret_access_key: str,
@@ -428,18 +604,18 @@ def echoflow_config_AWS(
             options={"option_key": "option_value"}
         )
     """
-    coro = AwsCredentials(
+    from prefect_aws import AwsCredentials
+
+    credentials = AwsCredentials(
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
         aws_session_token=aws_session_token,
         region_name=region_name,
-    ).save(name, overwrite=True)
-    if isinstance(coro, Coroutine):
-        coro = asyncio.run(coro)
+    )
     if isinstance(options, str):
         options = json.loads(options)
-    update_base_config(name=name, active=active,
-                       options=options, b_type=StorageType.AWS)
+    asyncio.run(_save_credentials(credentials, name=name, active=active,
+                                  options=options, b_type=StorageType.AWS))
 
 
 def echoflow_config_AZ_cosmos(
@@ -472,15 +648,15 @@ def echoflow_config_AZ_cosmos(
     """
     if connection_string is None:
         raise ValueError("Connection string cannot be empty.")
-    coro = AzureCosmosDbCredentials(
+    from prefect_azure import AzureCosmosDbCredentials
+
+    credentials = AzureCosmosDbCredentials(
         connection_string=connection_string
-    ).save(name, overwrite=True)
-    if isinstance(coro, Coroutine):
-        coro = asyncio.run(coro)
+    )
     if isinstance(options, str):
         options = json.loads(options)
-    update_base_config(name=name, active=active,
-                       options=options, b_type=StorageType.AZCosmos)
+    asyncio.run(_save_credentials(credentials, name=name, active=active,
+                                  options=options, b_type=StorageType.AZCosmos))
 
 
 def load_credential_configuration(sync: bool = False):
@@ -559,14 +735,16 @@ def load_credential_configuration(sync: bool = False):
                     config.write(config_file)
         except ValueError:
             raise ("No Echoflow configuration found.")
-    for section in config.sections():
-        provider = config.get(section, 'provider')
-        data_dict = dict(config[section])
-        data_dict['name'] = section
-        data_dict.pop('provider')
-        if provider == "AWS":
-            echoflow_config_AWS(**data_dict)
-        elif provider == "AZCosmos":
-            echoflow_config_AZ_cosmos(**data_dict)
-        else:
-            print(f"Unknown section: {provider}")
+    # Load the echoflow configuration block once for all the sections
+    with _echoflow_config_batch():
+        for section in config.sections():
+            provider = config.get(section, 'provider')
+            data_dict = dict(config[section])
+            data_dict['name'] = section
+            data_dict.pop('provider')
+            if provider == "AWS":
+                echoflow_config_AWS(**data_dict)
+            elif provider == "AZCosmos":
+                echoflow_config_AZ_cosmos(**data_dict)
+            else:
+                print(f"Unknown section: {provider}")
@@ -135,8 +135,7 @@ def process_combine_echodata(
             ceds.to_zarr(
                 save_path=out_zarr,
                 overwrite=True,
-                output_storage_options=dict(
-                    config.output.storage_options_dict),
+                output_storage_options=config.output.storage_options_dict,
                 compute=False
             )
             del ceds
@@ -152,8 +151,7 @@ def process_combine_echodata(
             ceds.to_zarr(
                 save_path=out_zarr,
                 overwrite=True,
-                output_storage_options=dict(
-                    config.output.storage_options_dict),
+                output_storage_options=config.output.storage_options_dict,
                 compute=False
             )
             del ceds
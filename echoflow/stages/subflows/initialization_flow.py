@@ -87,6 +87,7 @@ def init_flow(
 
     process_list = pipeline.pipeline
     client: Client = None
+    dask_task_runner: DaskTaskRunner = None
     process = None
     for process in process_list:
         if process.recipe_name == pipeline.active_recipe:
@@ -98,18 +99,22 @@ def init_flow(
         prefect_config_dict = get_prefect_config_dict(
             stage, pipeline, prefect_config_dict)
 
+        # The client and its task runner are created once and shared by all the stages
         if pipeline.scheduler_address is not None and pipeline.use_local_dask == False:
             if client is None:
                 client = Client(pipeline.scheduler_address)
-            prefect_config_dict["task_runner"] = DaskTaskRunner(
-                address=client.scheduler.address)
+                dask_task_runner = DaskTaskRunner(
+                    address=client.scheduler.address)
+            prefect_config_dict["task_runner"] = dask_task_runner
             print(client)
         elif pipeline.use_local_dask == True and prefect_config_dict is not None and prefect_config_dict.get("task_runner") is None:
             if client is None:
-                cluster = LocalCluster(n_workers=pipeline.n_workers)
+                cluster = LocalCluster(
+                    n_workers=pipeline.n_workers, processes=pipeline.local_dask_processes)
                 client = Client(cluster.scheduler_address)
-            prefect_config_dict["task_runner"] = DaskTaskRunner(
-                address=client.scheduler.address)
+                dask_task_runner = DaskTaskRunner(
+                    address=client.scheduler.address)
+            prefect_config_dict["task_runner"] = dask_task_runner
             print(client)
             print("Scheduler at : ", client.scheduler.address)
 
@@ -10,12 +10,14 @@ Classes:
 
 Functions:
     echoflow_open_raw(config: Dataset, stage: Stage, data: Union[str, List[List[Dict[str, Any]]]])
-    process_raw(raw, working_dir: str, config: Dataset, stage: Stage)
+    process_raw(raw, working_dir: str, config: Dataset, stage: Stage, prefetched: bool = False)
+    process_raw_batch(raws: List[Dict[str, Any]], working_dir: str, config: Dataset, stage: Stage)
 
 Author: Soham Butala
 Email: sbutala@uw.edu
 Date: August 22, 2023
 """
+import itertools as it
 import os
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
@@ -28,7 +30,7 @@ from echoflow.models.datastore import Dataset
 from echoflow.models.output_model import Output
 from echoflow.models.pipeline import Stage
 from echoflow.utils.file_utils import (download_temp_file, get_out_zarr, get_output,
-                                       get_working_dir, isFile,
+                                       get_working_dir, isFile, prefetch_raw_files,
                                        process_output_transects)
 
 
@@ -79,16 +81,33 @@ def echoflow_open_raw(config: Dataset, stage: Stage, prev_stage: Optional[Stage]
         output.data = ed
         outputs.append(output)
     else:
-        for raw_dicts in data:
-            for raw in raw_dicts:
-                new_processed_raw = process_raw.with_options(
-                    task_run_name=raw.get("file_path"), name=raw.get("file_path"), retries=3
+        batch_size = stage.options.get("batch_size", 1)
+        if batch_size > 1:
+            # Submit a single task per batch of raw files to cut scheduler overhead
+            raws = list(it.chain.from_iterable(data))
+            for i in range(0, len(raws), batch_size):
+                batch = raws[i: i + batch_size]
+                batch_name = batch[0].get("file_path")
+                # No retries: per-file errors are reported in the outputs, not raised
+                new_processed_batch = process_raw_batch.with_options(
+                    task_run_name=batch_name, name=batch_name
                 )
-                future = new_processed_raw.submit(
-                    raw, working_dir, config, stage)
+                future = new_processed_batch.submit(
+                    batch, working_dir, config, stage)
                 futures.append(future)
 
-        ed_list = [f.result() for f in futures]
+            ed_list = list(it.chain.from_iterable(f.result() for f in futures))
+        else:
+            for raw_dicts in data:
+                for raw in raw_dicts:
+                    new_processed_raw = process_raw.with_options(
+                        task_run_name=raw.get("file_path"), name=raw.get("file_path"), retries=3
+                    )
+                    future = new_processed_raw.submit(
+                        raw, working_dir, config, stage)
+                    futures.append(future)
+
+            ed_list = [f.result() for f in futures]
 
         outputs = process_output_transects(name=stage.name, config=config, ed_list=ed_list)
     return outputs
@@ -96,7 +115,7 @@ def echoflow_open_raw(config: Dataset, stage: Stage, prev_stage: Optional[Stage]
 
 @task()
 @echoflow()
-def process_raw(raw, working_dir: str, config: Dataset, stage: Stage):
+def process_raw(raw, working_dir: str, config: Dataset, stage: Stage, prefetched: bool = False):
     """
     Process a single raw sonar data file.
 
@@ -105,6 +124,7 @@ def process_raw(raw, working_dir: str, config: Dataset, stage: Stage):
         working_dir (str): Working directory for processing.
         config (Dataset): Configuration for the dataset being processed.
         stage (Stage): Configuration for the current processing stage.
+        prefetched (bool): Whether the raw file was already downloaded by `prefetch_raw_files`.
 
     Returns:
         Dict[str, Any]: Processed output information.
@@ -125,21 +145,25 @@ def process_raw(raw, working_dir: str, config: Dataset, stage: Stage):
         )
         print("Processed output:", processed_output)
     """
-    temp_file = download_temp_file(raw, working_dir, stage, config)
+    storage_options = config.output.storage_options_dict
+    if prefetched:
+        temp_file = raw
+    else:
+        temp_file = download_temp_file(raw, working_dir, stage, config)
     local_file = temp_file.get("local_path")
     local_file_name = os.path.basename(temp_file.get("local_path"))
     
     
     out_zarr = get_out_zarr(group = stage.options.get('group', True), working_dir=working_dir, transect=str(
-            raw.get("transect_num")), file_name=local_file_name.replace(".raw", ".zarr"), storage_options=config.output.storage_options_dict)
+            raw.get("transect_num")), file_name=local_file_name.replace(".raw", ".zarr"), storage_options=storage_options)
     
-    if stage.options.get("use_offline") == False or isFile(out_zarr, config.output.storage_options_dict) == False:
+    if stage.options.get("use_offline") == False or isFile(out_zarr, storage_options) == False:
         ed = open_raw(raw_file=local_file, sonar_model=raw.get(
-            "instrument"), storage_options=config.output.storage_options_dict)
+            "instrument"), storage_options=storage_options)
         ed.to_zarr(
             save_path=str(out_zarr),
             overwrite=True,
-            output_storage_options=config.output.storage_options_dict,
+            output_storage_options=storage_options,
             compute=False
         )
         del ed
@@ -148,3 +172,36 @@ def process_raw(raw, working_dir: str, config: Dataset, stage: Stage):
             local_file.unlink()
 
     return {'out_path': out_zarr, 'transect': raw.get("transect_num"), 'file_name': local_file_name, 'error': False}
+
+
+@task()
+def process_raw_batch(raws: List[Dict[str, Any]], working_dir: str, config: Dataset, stage: Stage):
+    """
+    Process a batch of raw sonar data files within a single task.
+
+    Raw files of the batch are downloaded concurrently and each one is converted as soon as
+    its download finishes, so a failing file is reported in its own output entry without
+    affecting the rest of the batch. Outputs are returned in the order of `raws`.
+
+    Args:
+        raws (List[Dict[str, Any]]): Raw file dictionaries to be processed.
+        working_dir (str): Working directory for processing.
+        config (Dataset): Configuration for the dataset being processed.
+        stage (Stage): Configuration for the current processing stage.
+
+    Returns:
+        List[Dict[str, Any]]: Processed output information for each raw file.
+
+    Example:
+        # Process a batch of raw files
+        processed_outputs = process_raw_batch(
+            raws=raw_dicts[:8],
+            working_dir=working_directory,
+            config=dataset_config,
+            stage=pipeline_stage
+        )
+    """
+    outputs: List[Dict[str, Any]] = [None] * len(raws)
+    for index, raw, downloaded in prefetch_raw_files(raws, working_dir, stage, config):
+        outputs[index] = process_raw.fn(raw, working_dir, config, stage, downloaded)
+    return outputs
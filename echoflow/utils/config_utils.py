@@ -31,10 +31,12 @@ Date: August 22, 2023
 """
 import asyncio
 import itertools as it
-import json
 import os
 import re
-from typing import Any, Coroutine, Dict, List, Literal, Optional, Union
+from collections import defaultdict
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Coroutine, Dict, Iterable, List, Literal, Optional, Union
 from zipfile import ZipFile
 from echoflow.models.echoflow_config import EchoflowConfig
 
@@ -44,8 +46,6 @@ from dateutil import parser
 from prefect import task
 from prefect.filesystems import *
 from prefect.task_runners import *
-from prefect_aws import AwsCredentials
-from prefect_azure import AzureCosmosDbCredentials
 
 from echoflow.aspects.echoflow_aspect import echoflow
 from echoflow.models.datastore import Dataset, StorageOptions, StorageType
@@ -53,6 +53,7 @@ from echoflow.models.pipeline import Recipe, Stage
 from echoflow.utils.file_utils import extract_fs, isFile, make_temp_folder
 
 TRANSECT_FILE_REGEX = r"x(?P<transect_num>\d+)"
+RAW_DATETIME_FORMAT = "%Y%m%d%H%M%S"
 nest_asyncio.apply()
 
 
@@ -242,6 +243,20 @@ def _extract_from_text(file_system, file_path: str, default_transect: int = 0) -
     return transect_dict
 
 
+@lru_cache(maxsize=64)
+def _compile_pattern(fname_pattern: str) -> re.Pattern:
+    """
+    Compiles and caches the regex pattern used to parse raw file names.
+
+    Parameters:
+        fname_pattern (str): The regex pattern for date extraction.
+
+    Returns:
+        re.Pattern: The compiled pattern.
+    """
+    return re.compile(fname_pattern)
+
+
 def parse_file_path(raw_file: str, fname_pattern: str) -> Dict[str, Any]:
     """
     Parses file path to extract datetime information.
@@ -258,14 +273,25 @@ def parse_file_path(raw_file: str, fname_pattern: str) -> Dict[str, Any]:
         fname_pattern = r'file_(?P<year>\d{4})_(?P<month>\d{2})(?P<day>\d{2})'
         parsed_data = parse_file_path(raw_file, fname_pattern)
     """
-    matcher = re.compile(fname_pattern)
+    matcher = _compile_pattern(fname_pattern)
     file_match = matcher.search(raw_file)
     match_dict = file_match.groupdict()
     file_datetime = None
     if "date" in match_dict and "time" in match_dict:
-        datetime_obj = parser.parse(f"{file_match['date']}{file_match['time']}")  # noqa
+        datetime_str = f"{file_match['date']}{file_match['time']}"
+        datetime_obj = None
+        # strptime backtracks into unpadded fields on shorter strings, so it is
+        # only trusted with full YYYYMMDDhhmmss timestamps
+        if len(datetime_str) == 14 and datetime_str.isdigit():
+            try:
+                datetime_obj = datetime.strptime(datetime_str, RAW_DATETIME_FORMAT)
+            except ValueError:
+                pass
+        if datetime_obj is None:
+            # Fall back to the slower but more lenient parser
+            datetime_obj = parser.parse(datetime_str)
         file_datetime = datetime_obj.isoformat()
-        jday = datetime_obj.timetuple().tm_yday
+        jday = datetime_obj.toordinal() - date(datetime_obj.year, 1, 1).toordinal() + 1
         match_dict.pop("date")
         match_dict.pop("time")
         match_dict.setdefault("month", datetime_obj.month)
@@ -336,11 +362,11 @@ def glob_all_files(config: Dataset) -> List[str]:
     if data_path is not None:
         if isinstance(data_path, list):
             for path in data_path:
-                all_files = glob_url(path, dict(storage_options))
+                all_files = glob_url(path, storage_options)
                 total_files.append(all_files)
             total_files = list(it.chain.from_iterable(total_files))
         else:
-            total_files = glob_url(data_path, dict(storage_options))
+            total_files = glob_url(data_path, storage_options)
 
     return total_files
 
@@ -415,7 +441,7 @@ def club_raw_files(
     json_storage_options: StorageOptions = None
 ) -> List[List[Dict[str, Any]]]:
     """
-    Parses raw URLs, splits them into weekly lists using Julian days.
+    Parses raw URLs, splits them into weekly lists (days 1-7, 8-14, ... of the year) using Julian days.
 
     Parameters:
         config (Dataset): The Pipeline configuration.
@@ -440,43 +466,57 @@ def club_raw_files(
         file_system = extract_fs(
             raw_url_file, storage_options=json_storage_options
         )
-        with file_system.open(raw_url_file) as f:
-            raw_dicts = json.load(f)
+        # Stream the records instead of loading the whole JSON array in memory
+        import ijson
+
+        with file_system.open(raw_url_file, "rb") as f:
+            return _club_raw_dicts(config, ijson.items(f, "item", use_float=True))
+
+    return _club_raw_dicts(config, raw_dicts)
+
+
+def _club_raw_dicts(config: Dataset, raw_dicts: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Groups raw URL dictionaries by transect or by week of the year in a single pass.
+    Weeks are fixed Julian day ranges (days 1-7, 8-14, ...).
 
+    Parameters:
+        config (Dataset): The Pipeline configuration.
+        raw_dicts (Iterable[Dict[str, Any]]): Raw URL dictionaries, either a list or a stream of records.
+
+    Returns:
+        List[List[Dict[str, Any]]]: List of lists of raw URL dictionaries grouped by transect or week.
+
+    Example:
+        dataset_config = ...
+        raw_dicts = [...]
+        grouped_raw_data = _club_raw_dicts(dataset_config, raw_dicts)
+    """
     if config.args.transect is not None:
         # Transect, split by transect spec
-        raw_dct = {}
+        raw_dct = defaultdict(list)
         for r in raw_dicts:
-            transect_num = r['transect_num']
-            if transect_num not in raw_dct:
-                raw_dct[transect_num] = []
-            raw_dct[transect_num].append(r)
+            raw_dct[r['transect_num']].append(r)
 
-        all_files = [
+        return [
             sorted(raw_list, key=lambda a: a['datetime'])
             for raw_list in raw_dct.values()
         ]
-    else:
-        # Number of days for a week chunk
-        n = 7
 
-        all_jdays = sorted({r.get("jday") for r in raw_dicts})
-        split_days = [
-            all_jdays[i: i + n] for i in range(0, len(all_jdays), n)
-        ]  # noqa
+    # Number of days for a week chunk
+    n = 7
 
-        day_dict = {}
-        for r in raw_dicts:
-            mint = r.get("jday")
-            if mint not in day_dict:
-                day_dict[mint] = []
-            day_dict[mint].append(r)
-
-        all_files = []
-        for week in split_days:
-            files = list(it.chain.from_iterable([day_dict[d] for d in week]))
-            all_files.append(files)
-    return all_files
+    # Bucket directly into weeks of the year, files without a date share one bucket
+    week_dict = defaultdict(list)
+    for r in raw_dicts:
+        jday = r.get("jday")
+        week_dict[None if jday is None else (jday - 1) // n].append(r)
+
+    # Keep files ordered by day within a week
+    return [
+        sorted(week_dict[week], key=lambda r: r.get("jday") or 0)
+        for week in sorted(week_dict, key=lambda w: -1 if w is None else w)
+    ]
 
 
 def get_storage_options(storage_options: Block = None) -> Dict[str, Any]:
@@ -493,6 +533,8 @@ def get_storage_options(storage_options: Block = None) -> Dict[str, Any]:
         aws_credentials = AwsCredentials(...)
         storage_opts = get_storage_options(aws_credentials)
     """
+    from prefect_aws import AwsCredentials
+
     storage_options_dict: Dict[str, Any] = {}
     if storage_options is not None:
         if isinstance(storage_options, AwsCredentials):
@@ -525,9 +567,12 @@ def load_block(name: str = None, type: StorageType = None):
     if name is None or type is None:
         raise ValueError("Cannot load block without name")
 
+    # Cloud credential blocks are imported on demand as they pull in their SDKs
     if type == StorageType.AWS or type == StorageType.AWS.value:
+        from prefect_aws import AwsCredentials
         coro = AwsCredentials.load(name=name)
     elif type == StorageType.AZCosmos or type == StorageType.AZCosmos.value:
+        from prefect_azure import AzureCosmosDbCredentials
         coro = AzureCosmosDbCredentials.load(name=name)
     elif type == StorageType.ECHOFLOW or type == StorageType.ECHOFLOW.value:
         coro = EchoflowConfig.load(name=name)
@@ -5,6 +5,9 @@ Module Functions:
     download_temp_file(raw: Dict[str, Any], working_dir: str, stage: Stage, config: Dataset) -> Dict[str, Any]:
         Downloads a temporary raw file from a URL path.
 
+    prefetch_raw_files(raws: List[Dict[str, Any]], working_dir: str, stage: Stage, config: Dataset) -> Iterator[Tuple[int, Dict[str, Any], bool]]:
+        Downloads several raw files concurrently, yielding each one as soon as its download finishes.
+
     extract_fs(url: str, storage_options: Dict[Any, Any] = {}, include_scheme: bool = False) -> Union[Tuple[Any, str], Any]:
         Extracts the fsspec file system from a URL path.
 
@@ -31,17 +34,18 @@ Email: sbutala@uw.edu
 Date: August 22, 2023
 """
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import os
 import platform
+import posixpath
+import shutil
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import fsspec
-import xarray as xr
 from dateutil import parser
-from echopype import open_converted
 from fastapi.encoders import jsonable_encoder
 from fsspec.implementations.local import LocalFileSystem
 from prefect import task
@@ -50,6 +54,13 @@ from echoflow.models.datastore import Dataset
 from echoflow.models.output_model import Output
 from echoflow.models.pipeline import Stage
 
+# Size of the chunks streamed when copying raw files (4 MiB)
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# Maximum number of raw files downloaded concurrently when prefetching
+MAX_DOWNLOAD_WORKERS = 16
+# Maximum number of converted zarr stores opened concurrently
+MAX_OPEN_WORKERS = 16
+
 
 def download_temp_file(raw, working_dir: str, stage: Stage, config: Dataset):
     """
@@ -74,28 +85,68 @@ def download_temp_file(raw, working_dir: str, stage: Stage, config: Dataset):
 
     urlpath = raw.get("file_path")
     fname = os.path.basename(urlpath)
+    storage_options = config.output.storage_options_dict
     
     if stage.options['group'] == False:
-       out_path = format_windows_path(working_dir+"/raw_files/"+fname, slash=True)
-       make_temp_folder(format_windows_path(working_dir+"/raw_files/", slash=True), config.output.storage_options_dict)
-    else: 
-        out_path = format_windows_path(working_dir+"/"+ str(raw.get("transect_num")) +"_raw_files/"+fname, slash=True)
-        make_temp_folder(format_windows_path(working_dir+"/"+ str(raw.get("transect_num")) +"_raw_files/", slash=True), config.output.storage_options_dict)    
+        raw_dir = posixpath.join(working_dir, "raw_files")
+    else:
+        raw_dir = posixpath.join(working_dir, str(raw.get("transect_num")) + "_raw_files")
+    out_path = format_windows_path(posixpath.join(raw_dir, fname), slash=True)
+    make_temp_folder(format_windows_path(raw_dir, slash=True), storage_options)
     
     print(out_path)
     working_dir_fs = extract_fs(
-        out_path, storage_options=config.output.storage_options_dict)
+        out_path, storage_options=storage_options)
 
-    if stage.options.get("use_raw_offline") == False or isFile(out_path, config.output.storage_options_dict) == False:
+    if stage.options.get("use_raw_offline") == False or isFile(out_path, storage_options) == False:
         print("Downloading ...", out_path)
         file_system = extract_fs(
             urlpath, storage_options=config.args.storage_options_dict)
         with file_system.open(urlpath, 'rb') as source_file:
             with working_dir_fs.open(out_path, mode="wb") as f:
-                f.write(source_file.read())
+                shutil.copyfileobj(source_file, f, length=DOWNLOAD_CHUNK_SIZE)
     raw.update({"local_path": out_path})
     return raw
 
+def prefetch_raw_files(
+    raws: List[Dict[str, Any]], working_dir: str, stage: Stage, config: Dataset
+) -> Iterator[Tuple[int, Dict[str, Any], bool]]:
+    """
+    Downloads several raw files concurrently, yielding each one as soon as its download finishes.
+
+    Downloaded raw file dictionaries are updated in place with their `local_path`.
+    Files that fail to download are yielded as not downloaded so the download is
+    retried and reported when the file itself is processed.
+
+    Args:
+        raws (List[Dict[str, Any]]): Raw file dictionaries containing file information.
+        working_dir (str): Working directory where the files will be downloaded.
+        stage (Stage): Current processing stage object.
+        config (Dataset): Dataset configuration.
+
+    Yields:
+        Tuple[int, Dict[str, Any], bool]: Index of the raw file in `raws`, the raw file
+        dictionary and whether it was downloaded, in download completion order.
+
+    Example:
+        raw_batch = [{'file_path': 'https://example.com/data1.raw', ...}, ...]
+        for index, raw, downloaded in prefetch_raw_files(raw_batch, working_directory, stage_object, dataset_config):
+            ...
+    """
+    def _download(raw):
+        try:
+            download_temp_file(raw, working_dir, stage, config)
+            return True
+        except Exception as e:
+            print("Failed to prefetch", raw.get("file_path"), e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        futures = {executor.submit(_download, raw): index for index, raw in enumerate(raws)}
+        for future in as_completed(futures):
+            index = futures[future]
+            yield index, raws[index], future.result()
+
 def format_windows_path(path: str, slash: bool = False):
     if platform.system() == "Windows" and not path.startswith(('file:///', 's3://', 'http://', 'https://')):            
         if slash:
@@ -125,6 +176,7 @@ def extract_fs(
         fs = extract_fs('s3://mybucket/data', storage_options={'anon': True})
     """
     parsed_path = urlparse(format_windows_path(url))
+    # fsspec caches instances per process and thread, so no memo is kept here
     file_system = fsspec.filesystem(parsed_path.scheme, **storage_options)
     if include_scheme:
         return file_system, parsed_path.scheme
@@ -143,10 +195,10 @@ def make_temp_folder(folder_name: str, storage_options: Dict[str, Any]) -> str:
 
     Example:
         temp_folder = make_temp_folder('temp_folder', storage_options={'anon': True})
-    """    
+    """
     fsmap = fsspec.get_mapper(folder_name, **storage_options)
     if fsmap.fs.isdir(fsmap.root) == False:
-        fsmap.fs.mkdir(fsmap.root, exists_ok=True, create_parents=True)
+        fsmap.fs.makedirs(fsmap.root, exist_ok=True)
     if isinstance(fsmap.fs, LocalFileSystem):
         return str(Path(folder_name).resolve())
     return folder_name
@@ -184,7 +236,7 @@ def get_output_file_path(raw_dicts, config: Dataset):
         transect_num = first_file.get("transect_num", None)
         date_name = datetime_obj.strftime("D%Y%m%d-T%H%M%S")
         out_fname = f"x{transect_num:04}-{date_name}.zarr"
-    return format_windows_path("/".join([config.output.urlpath, out_fname]))
+    return format_windows_path(posixpath.join(config.output.urlpath, out_fname))
 
 def isFile(file_path: str, storage_options: Dict[str, Any] = {}):
     """
@@ -226,10 +278,10 @@ def get_working_dir(stage: Stage, config: Dataset):
             "out_path"), config.output.storage_options_dict)
     elif config.output.urlpath is not None:
         working_dir = make_temp_folder(
-            config.output.urlpath+"/"+stage.name, config.output.storage_options_dict)
+            posixpath.join(config.output.urlpath, stage.name), config.output.storage_options_dict)
     else:
         working_dir = make_temp_folder(
-            "Echoflow_working_dir"+"/"+stage.name, config.output.storage_options_dict)
+            posixpath.join("Echoflow_working_dir", stage.name), config.output.storage_options_dict)
 
     return working_dir
 
@@ -252,28 +304,24 @@ def get_ed_list(config: Dataset, stage: Stage, transect_data: Union[Output, List
         transect_output = ...
         echopype_list = get_ed_list(dataset_config, stage_object, transect_output)
     """
-    ed_list = []
-    if type(transect_data) == list:
-        for zarr_path_data in transect_data:
-            ed = open_converted(
-                converted_raw_path=str(zarr_path_data.get("out_path")),
-                storage_options=dict(config.output.storage_options_dict),
-            )
-            ed_list.append(ed)
-    elif type(transect_data) == dict:
-        ed = open_converted(
-            converted_raw_path=str(transect_data.get("out_path")),
-            storage_options=dict(config.output.storage_options_dict),
-        )
-        ed_list.append(ed)
-    else:
-        zarr_path_data = transect_data.data
-        ed = open_converted(
+    # Imported here to keep echopype off the import path of echoflow
+    from echopype import open_converted
+
+    storage_options = config.output.storage_options_dict
+
+    def _open(zarr_path_data):
+        return open_converted(
             converted_raw_path=str(zarr_path_data.get("out_path")),
-            storage_options=dict(config.output.storage_options_dict),
+            storage_options=storage_options,
         )
-        ed_list.append(ed)
-    return ed_list
+
+    zarr_paths_data = _normalize_transect_data(transect_data)
+    if len(zarr_paths_data) == 1:
+        return [_open(zarr_paths_data[0])]
+
+    # open_converted is I/O bound, open the zarr stores concurrently
+    with ThreadPoolExecutor(max_workers=MAX_OPEN_WORKERS) as executor:
+        return list(executor.map(_open, zarr_paths_data))
 
 @task
 def get_zarr_list(transect_data: Union[Output, Dict], storage_options: Dict[str, Any] = {}):
@@ -292,18 +340,29 @@ def get_zarr_list(transect_data: Union[Output, Dict], storage_options: Dict[str,
         transect_output = ...
         zarr_list = get_zarr_list(transect_output, storage_options)
     """
-    zarr_list = []
-    if type(transect_data) == dict:
-        zarr = xr.open_zarr(transect_data.get("out_path"),
-                            storage_options=storage_options)
-        zarr_list.append(zarr)
-    else:
-        zarr_path_data = transect_data.data
-        zarr = xr.open_zarr(zarr_path_data.get("out_path"),
-                            storage_options=storage_options)
-        zarr_list.append(zarr)
+    # Imported here to keep xarray off the import path of echoflow
+    import xarray as xr
 
-    return zarr_list
+    return [
+        xr.open_zarr(zarr_path_data.get("out_path"), storage_options=storage_options)
+        for zarr_path_data in _normalize_transect_data(transect_data)
+    ]
+
+def _normalize_transect_data(transect_data: Union[Output, List[Dict], Dict]) -> List[Dict[str, Any]]:
+    """
+    Normalizes transect data into a list of output path dictionaries.
+
+    Parameters:
+        transect_data (Union[Output, List[Dict[str, Any]], Dict[str, Any]]): The transect data or output.
+
+    Returns:
+        List[Dict[str, Any]]: Dictionaries holding the `out_path` of each zarr store.
+    """
+    if isinstance(transect_data, list):
+        return transect_data
+    if isinstance(transect_data, dict):
+        return [transect_data]
+    return [transect_data.data]
 
 def process_output_transects(name: str, config: Dataset, ed_list: List[Dict[str, Any]]) -> List[Output]:
     """
@@ -338,19 +397,15 @@ def process_output_transects(name: str, config: Dataset, ed_list: List[Dict[str,
     """
     error_flag = False
     transect_dict = defaultdict(list)
-    outputs: List[Output] = []
     for ed in ed_list:
         if ed["error"] == True:
             error_flag = True
             print("Encountered Some Error")
             print(ed['error_desc'])
         else:
-            transect = ed['transect']
-            transect_dict[transect].append(ed)            
+            transect_dict[ed['transect']].append(ed)
 
-    for transect in transect_dict.keys():
-        output = Output(data=transect_dict[transect])
-        outputs.append(output)
+    outputs: List[Output] = [Output(data=eds) for eds in transect_dict.values()]
     if error_flag:
         store_json_output(data=outputs, config=config, name=name)
         raise ValueError("Could not complete "+name+" successfully since 1 or more raw files" 
@@ -393,8 +448,8 @@ def store_json_output(data, config: Dataset, name: str):
 
     if config.args.json_export:
         out_path = make_temp_folder(
-            config.output.urlpath+"/json_metadata", config.output.storage_options_dict)
-        out_path = out_path+"/"+name+".json" # Changed Needed
+            posixpath.join(config.output.urlpath, "json_metadata"), config.output.storage_options_dict)
+        out_path = posixpath.join(out_path, name + ".json")
         print("Output metdata will be loaded to ",out_path)
         fs = extract_fs(out_path, config.output.storage_options_dict)
         with fs.open(out_path, mode="w") as f: